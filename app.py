@@ -1,8 +1,28 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from fastapi import FastAPI, Header, HTTPException, Response
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 import pandas as pd
 from ortools.sat.python import cp_model
+from menu_index import (
+    INTOLERANCE_COLUMNS,
+    assemble_from_index,
+    filter_intolerances,
+    join_intolerance_flags,
+    load_menu_index,
+)
+from tenants import SolverQuota, TenantCaches, TenantCatalog
 
 app = FastAPI()
 
@@ -10,6 +30,68 @@ app = FastAPI()
 recipe_df = pd.read_csv("recipe_api.csv")
 # Convert relevant columns to integers
 recipe_df["id"] = recipe_df["id"].astype(int)
+# Parse meal types for each recipe once; every tenant shares these columns
+recipe_df['meal_types_set'] = recipe_df['categories'].apply(
+    lambda x: set(map(int, x.split(',')))
+)
+# recipe_api.csv carries no intolerance flags; join them by recipe id
+RECIPE_FLAGS_PATH = os.environ.get("RECIPE_FLAGS_PATH", "updated_recipe_df.csv")
+if os.path.exists(RECIPE_FLAGS_PATH):
+    recipe_df = join_intolerance_flags(recipe_df, RECIPE_FLAGS_PATH)
+
+# Per-company catalogs are row positions into the shared recipe_df, taken
+# from the company_id column of COMPANY_RECIPES_PATH
+COMPANY_RECIPES_PATH = os.environ.get("COMPANY_RECIPES_PATH", "updated_recipe_df.csv")
+tenant_catalog = TenantCatalog(
+    recipe_df, COMPANY_RECIPES_PATH if os.path.exists(COMPANY_RECIPES_PATH) else None
+)
+# Cache partitions and solver slots are per company (None is the global catalog)
+tenant_caches = TenantCaches(
+    max_tenants=int(os.environ.get("TENANT_CACHE_MAX_TENANTS", 64)),
+    entries_per_tenant=int(os.environ.get("TENANT_CACHE_ENTRIES", 16)),
+)
+solver_quota = SolverQuota(
+    pool_size=int(os.environ.get("SOLVER_POOL_SIZE", 4)),
+    per_tenant=int(os.environ.get("TENANT_SOLVER_QUOTA", 2)),
+    timeout=float(os.environ.get("SOLVER_QUEUE_TIMEOUT_SECONDS", 30)),
+)
+
+# Precomputed feasible daily menus (built offline with `python menu_index.py`)
+MENU_INDEX_PATH = os.environ.get("MENU_INDEX_PATH", "menu_index.npz")
+menu_index = load_menu_index(MENU_INDEX_PATH) if os.path.exists(MENU_INDEX_PATH) else {}
+
+# On-demand request profiling: requests sent with `X-Debug-Profile: 1` and a
+# matching `X-Admin-Token` keep their cProfile output and CP-SAT search logs
+# in a bounded ring buffer, readable from /admin/debug-profiles
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+DEBUG_PROFILE_BUFFER_SIZE = int(os.environ.get("DEBUG_PROFILE_BUFFER_SIZE", 20))
+debug_profiles = deque(maxlen=DEBUG_PROFILE_BUFFER_SIZE)
+# Since Python 3.12 only one cProfile profiler may be active per interpreter,
+# and it sees every thread; debug requests that find it busy skip cProfile
+# but still capture their CP-SAT logs
+profile_lock = threading.Lock()
+# Stored with each profile: on 3.12+ it also counts other request threads
+PROFILE_SCOPE = "process" if sys.version_info >= (3, 12) else "thread"
+TRUE_HEADER_VALUES = {"1", "true", "yes"}
+
+def is_admin(token):
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+# Plans longer than MAX_SINGLE_SOLVE_DAYS are solved one window at a time;
+# a recipe may come back once it has not been used for RECIPE_COOLDOWN_DAYS
+MAX_SINGLE_SOLVE_DAYS = 14
+MAX_PLAN_DAYS = 90
+PLANNING_WINDOW_DAYS = 7
+RECIPE_COOLDOWN_DAYS = 14
+# Total time budget of a rolling plan, shared out across the remaining windows
+ROLLING_PLAN_DEADLINE_SECONDS = float(os.environ.get("ROLLING_PLAN_DEADLINE_SECONDS", 60))
+
+class SolverTimeLimitReached(Exception):
+    """
+    CP-SAT ran out of time before proving the model feasible or infeasible
+    """
 
 meal_type_enum_map = {
     "breakfast": 0,
@@ -44,14 +126,38 @@ class MealPlanRequest(BaseModel):
     fats: float = Field(default=0.3, ge=0, le=1)
     protein: float = Field(default=0.2, ge=0, le=1)
     types: List[int] = Field(default=[0, 1, 2, 3, 4])
-    days: int = Field(default=7, gt=0, le=14)
-
-def query_food_database():
-    # CHANGED: Parse meal types for each recipe
-    recipe_df['meal_types_set'] = recipe_df['categories'].apply(
-        lambda x: set(map(int, x.split(',')))
-    )
-    return recipe_df
+    days: int = Field(default=7, gt=0, le=MAX_PLAN_DAYS)
+    intolerances: List[str] = Field(default=[])
+    company_id: Optional[int] = None
+
+    @field_validator("intolerances")
+    @classmethod
+    def check_intolerances(cls, value):
+        unknown = [i for i in value if i not in INTOLERANCE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown intolerances {unknown}; expected any of {INTOLERANCE_COLUMNS}")
+        return sorted(set(value))
+
+def query_food_database(company_id=None, intolerances=()):
+    selected_recipes = recipe_df
+    if company_id is not None:
+        positions = tenant_catalog.positions(company_id)
+        if positions is None:
+            raise HTTPException(status_code=404, detail=f"Unknown company {company_id}")
+        selected_recipes = recipe_df.iloc[positions]
+    return filter_intolerances(selected_recipes, intolerances)
+
+@contextmanager
+def solver_slot(company_id, timeout=None):
+    """
+    Hold one of the company's CP-SAT slots for the duration of a solve
+    """
+    if not solver_quota.acquire(company_id, timeout):
+        raise HTTPException(status_code=429, detail="Solver capacity exhausted, retry later")
+    try:
+        yield
+    finally:
+        solver_quota.release(company_id)
 
 def calculate_macronutrient_targets(
     calories_per_day, carbs_ratio, fats_ratio, protein_ratio
@@ -67,8 +173,39 @@ def calculate_macronutrient_targets(
         "protein": protein_calories // 4,
     }
 
+def plan_from_index(targets, days, meal_types, intolerances=(), exclude=(), company_id=None):
+    """
+    Assemble a plan from the precomputed menu index.
+    Returns None on a miss so the caller can fall back to generate_meal_plan.
+    """
+    days_recipes = assemble_from_index(
+        menu_index,
+        targets,
+        days,
+        meal_types,
+        intolerances=intolerances,
+        exclude=exclude,
+        allowed_ids=None if company_id is None else tenant_catalog.recipe_ids_for(company_id),
+        cache=tenant_caches.partition(company_id),
+    )
+    if days_recipes is None:
+        return None
+    return [
+        {
+            meal_type_map[meal_type]: [{"recipe_id": recipe_id, "amount": 1}]
+            for meal_type, recipe_id in zip(sorted(set(meal_types)), recipes)
+        }
+        for recipes in days_recipes
+    ]
+
 def generate_meal_plan(
-    selected_recipes, targets, days, meal_types, allow_multiple_dishes=False
+    selected_recipes,
+    targets,
+    days,
+    meal_types,
+    allow_multiple_dishes=False,
+    debug=None,
+    deadline=None,
 ):
     model = cp_model.CpModel()
     recipe_vars = {}
@@ -155,7 +292,23 @@ def generate_meal_plan(
 
     # Solve the model
     solver = cp_model.CpSolver()
+    if deadline is not None:
+        # The deadline (time.monotonic()) also covers model building and the
+        # multi-dish retry
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise SolverTimeLimitReached("Planning deadline exceeded")
+        solver.parameters.max_time_in_seconds = remaining
+    search_log = []
+    if debug is not None:
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = search_log.append
     status = solver.Solve(model)
+    if debug is not None:
+        debug["solverRuns"].append(solver_run_stats(solver, status, search_log, allow_multiple_dishes))
+    if status == cp_model.UNKNOWN:
+        raise SolverTimeLimitReached("Planning deadline exceeded")
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
         weekly_plan = []
         for day in range(days):
@@ -175,12 +328,105 @@ def generate_meal_plan(
     elif not allow_multiple_dishes:
         print("Single-dish meal plan infeasible; attempting multi-dish plan.")
         return generate_meal_plan(
-            selected_recipes, targets, days, meal_types, allow_multiple_dishes=True
+            selected_recipes,
+            targets,
+            days,
+            meal_types,
+            allow_multiple_dishes=True,
+            debug=debug,
+            deadline=deadline,
         )
     else:
         print("No feasible meal plan found.")
         return None
 
+def generate_rolling_meal_plan(
+    selected_recipes, targets, days, meal_types, intolerances=(), debug=None, company_id=None
+):
+    """
+    Plan a long horizon one PLANNING_WINDOW_DAYS window at a time.
+    Recipes used in the last RECIPE_COOLDOWN_DAYS days are excluded from the
+    next window instead of forbidding repeats over the whole horizon, so
+    model size and solve time stay flat per window. The whole plan must
+    finish within ROLLING_PLAN_DEADLINE_SECONDS; SolverTimeLimitReached is
+    raised as soon as a window uses up its share.
+    """
+    plan = []
+    recent_days = deque(maxlen=RECIPE_COOLDOWN_DAYS)
+    plan_deadline = time.monotonic() + ROLLING_PLAN_DEADLINE_SECONDS
+
+    while len(plan) < days:
+        window_days = min(PLANNING_WINDOW_DAYS, days - len(plan))
+        windows_left = -(-(days - len(plan)) // PLANNING_WINDOW_DAYS)
+        now = time.monotonic()
+        if now >= plan_deadline:
+            raise SolverTimeLimitReached("Planning deadline exceeded")
+        window_deadline = now + (plan_deadline - now) / windows_left
+
+        # Relax the cooldown step by step if the window is infeasible
+        window_plan = None
+        cooldown = RECIPE_COOLDOWN_DAYS
+        while window_plan is None:
+            excluded = set().union(*list(recent_days)[-cooldown:]) if cooldown else set()
+            window_plan = plan_from_index(
+                targets,
+                window_days,
+                meal_types,
+                intolerances=intolerances,
+                exclude=excluded,
+                company_id=company_id,
+            )
+            if window_plan is None:
+                # Only hold a solver slot while CP-SAT actually runs
+                with solver_slot(company_id, timeout=max(window_deadline - time.monotonic(), 0)):
+                    window_plan = generate_meal_plan(
+                        selected_recipes[~selected_recipes["id"].isin(excluded)],
+                        targets,
+                        window_days,
+                        meal_types,
+                        debug=debug,
+                        deadline=window_deadline,
+                    )
+            if window_plan is None:
+                if cooldown == 0:
+                    return None
+                print(f"Window infeasible with {cooldown}-day cooldown; relaxing.")
+                cooldown //= 2
+
+        for daily_plan in window_plan:
+            recent_days.append(
+                {meal["recipe_id"] for meals in daily_plan.values() for meal in meals}
+            )
+        plan.extend(window_plan)
+
+    return plan
+
+def solver_run_stats(solver, status, search_log, allow_multiple_dishes):
+    """
+    Collect the CP-SAT response stats and search log of one Solve() call
+    """
+    # Worker count and presolve reductions are only reported in the search log
+    num_workers = None
+    presolve_rules = []
+    for line in search_log:
+        match = re.search(r"Setting number of workers to (\d+)", line)
+        if match and num_workers is None:
+            num_workers = int(match.group(1))
+        elif re.match(r"\s*- rule '.*' was applied \d+ times?", line):
+            presolve_rules.append(line.strip())
+
+    return {
+        "allowMultipleDishes": allow_multiple_dishes,
+        "status": solver.StatusName(status),
+        "wallTime": solver.WallTime(),
+        "numBranches": solver.NumBranches(),
+        "numConflicts": solver.NumConflicts(),
+        "numWorkers": num_workers,
+        "presolveRules": presolve_rules,
+        "responseStats": solver.ResponseStats(),
+        "searchLog": search_log,
+    }
+
 def format_meal_plan(weekly_plan: List, user_preferences: dict, selected_recipes: pd.DataFrame) -> dict:
     """
     Format the meal plan into a structured JSON response with camelCase keys
@@ -274,11 +520,47 @@ def format_meal_plan(weekly_plan: List, user_preferences: dict, selected_recipes
 async def health_check():
     return {"status": "ok"}
 
+# Plain def: FastAPI runs it in its threadpool, so solves for different
+# companies can run concurrently within their solver quotas
 @app.post("/api/generate-meal-plan")
-async def generate_meal_plan_endpoint(request: MealPlanRequest):
+def generate_meal_plan_endpoint(
+    request: MealPlanRequest,
+    response: Response,
+    x_debug_profile: Optional[str] = Header(default=None),
+    x_admin_token: Optional[str] = Header(default=None),
+):
+    debug = None
+    debug_headers = None
+    profiler = None
+    if (x_debug_profile or "").strip().lower() in TRUE_HEADER_VALUES and is_admin(x_admin_token):
+        debug = {
+            "id": uuid.uuid4().hex,
+            "timestamp": time.time(),
+            "request": request.model_dump(),
+            "planSource": None,
+            "solverRuns": [],
+            "profile": None,
+            "profileScope": PROFILE_SCOPE,
+            "error": None,
+        }
+        debug_headers = {"X-Debug-Profile-Id": debug["id"]}
+        response.headers.update(debug_headers)
+
     try:
+        if debug is not None:
+            if profile_lock.acquire(blocking=False):
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiling tool owns sys.monitoring
+                    profiler = None
+                    profile_lock.release()
+            if profiler is None:
+                debug["profile"] = "skipped: another profile was being captured"
+
         # Get recipes from database
-        selected_recipes = query_food_database()
+        selected_recipes = query_food_database(request.company_id, request.intolerances)
         
         # Calculate targets
         targets = calculate_macronutrient_targets(
@@ -295,25 +577,81 @@ async def generate_meal_plan_endpoint(request: MealPlanRequest):
             **targets
         }
         
-        # Generate the meal plan
-        weekly_plan = generate_meal_plan(
-            selected_recipes,
-            targets,
-            request.days,
-            request.types
-        )
+        # Generate the meal plan, solving with CP-SAT only on an index miss;
+        # long horizons are planned window by window
+        if request.days > MAX_SINGLE_SOLVE_DAYS:
+            plan_source = "rolling"
+            weekly_plan = generate_rolling_meal_plan(
+                selected_recipes,
+                targets,
+                request.days,
+                request.types,
+                intolerances=request.intolerances,
+                debug=debug,
+                company_id=request.company_id
+            )
+        else:
+            weekly_plan = plan_from_index(
+                targets,
+                request.days,
+                request.types,
+                intolerances=request.intolerances,
+                company_id=request.company_id
+            )
+            plan_source = "index"
+            if weekly_plan is None:
+                plan_source = "solver"
+                with solver_slot(request.company_id):
+                    weekly_plan = generate_meal_plan(
+                        selected_recipes,
+                        targets,
+                        request.days,
+                        request.types,
+                        debug=debug
+                    )
+        if debug is not None:
+            debug["planSource"] = plan_source
         
         # Format the response
-        response = format_meal_plan(
+        return format_meal_plan(
             weekly_plan,
             user_preferences,
             selected_recipes
         )
-        
-        return response
+
+    except HTTPException as e:
+        if debug is not None:
+            debug["error"] = e.detail
+            e.headers = {**(e.headers or {}), **debug_headers}
+        raise
+
+    except SolverTimeLimitReached as e:
+        if debug is not None:
+            debug["error"] = str(e)
+        # A server-side time budget ran out; the client may retry later
+        headers = {"Retry-After": str(int(ROLLING_PLAN_DEADLINE_SECONDS)), **(debug_headers or {})}
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
 
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        if debug is not None:
+            debug["error"] = str(e)
+        raise HTTPException(status_code=400, detail=str(e), headers=debug_headers)
+
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_lock.release()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(50)
+            debug["profile"] = stream.getvalue()
+        if debug is not None:
+            debug_profiles.append(debug)
+
+@app.get("/admin/debug-profiles")
+async def debug_profiles_endpoint(x_admin_token: Optional[str] = Header(default=None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {"profiles": list(debug_profiles)}
 
 if __name__ == "__main__":
 
@@ -0,0 +1,278 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Calorie bucket width; requests are keyed by round(calories / CALORIE_BUCKET)
+CALORIE_BUCKET = 100
+# Same +-100 kcal window used by generate_meal_plan
+CALORIE_TOLERANCE = 100
+
+INTOLERANCE_COLUMNS = [
+    "Lactose Intolerance",
+    "Gluten Intolerance",
+    "Soy Intolerance",
+    "Nut Allergy",
+    "Shellfish Allergy",
+    "Egg Allergy",
+    "Dairy-Free",
+    "Vegan",
+    "Vegetarian",
+]
+
+
+def types_mask(meal_types):
+    mask = 0
+    for meal_type in meal_types:
+        mask |= 1 << int(meal_type)
+    return mask
+
+
+def intolerance_mask(intolerances):
+    mask = 0
+    for intolerance in intolerances:
+        mask |= 1 << INTOLERANCE_COLUMNS.index(intolerance)
+    return mask
+
+
+def index_key(calorie_bucket, meal_types, intolerances=()):
+    return f"{int(calorie_bucket)}_{types_mask(meal_types)}_{intolerance_mask(intolerances)}"
+
+
+def calorie_bucket(calories):
+    return int(round(calories / CALORIE_BUCKET))
+
+
+def _nutrient_table(recipe_df):
+    # Truncate to int exactly like the CP-SAT model does
+    return np.column_stack(
+        [
+            recipe_df["energy_kcal"].astype(float).astype(int).to_numpy(),
+            recipe_df["carbs"].astype(float).astype(int).to_numpy(),
+            recipe_df["total_fats"].astype(float).astype(int).to_numpy(),
+            recipe_df["protein"].astype(float).astype(int).to_numpy(),
+        ]
+    ).astype(np.int32)
+
+
+def join_intolerance_flags(recipe_df, flags_path):
+    """
+    Add the INTOLERANCE_COLUMNS flags from `flags_path` (e.g.
+    updated_recipe_df.csv) by recipe id. Recipes missing from that file are
+    flagged 1 so they are never served to a user who must avoid something.
+    """
+    flags = pd.read_csv(flags_path, usecols=["id"] + INTOLERANCE_COLUMNS)
+    recipe_df = recipe_df.drop(columns=INTOLERANCE_COLUMNS, errors="ignore")
+    recipe_df = recipe_df.merge(flags, on="id", how="left")
+    recipe_df[INTOLERANCE_COLUMNS] = recipe_df[INTOLERANCE_COLUMNS].fillna(1).astype(int)
+    return recipe_df
+
+
+def filter_intolerances(recipe_df, intolerances):
+    for intolerance in intolerances:
+        if intolerance not in recipe_df.columns:
+            raise ValueError(f"Recipe catalog has no '{intolerance}' column")
+        recipe_df = recipe_df[recipe_df[intolerance] != 1]
+    return recipe_df
+
+
+def sample_daily_menus(recipe_df, meal_types, lower, upper, samples, rng):
+    """
+    Sample single-dish one-day menus (one recipe per meal type, no recipe
+    repeated) whose total calories fall within [lower, upper].
+    Returns (ids, totals): ids is (n, len(meal_types)) recipe ids in
+    meal_types order, totals is (n, 4) kcal/carbs/fats/protein.
+    """
+    meal_types = sorted(set(meal_types))
+    ids = recipe_df["id"].to_numpy(dtype=np.int32)
+    nutrients = _nutrient_table(recipe_df)
+    candidates = [
+        np.flatnonzero(recipe_df["meal_types_set"].apply(lambda s: meal_type in s).to_numpy())
+        for meal_type in meal_types
+    ]
+    if any(len(c) == 0 for c in candidates):
+        return np.empty((0, len(meal_types)), np.int32), np.empty((0, 4), np.int32)
+
+    # Draw the first n-1 slots at random, then pick the last slot among the
+    # recipes whose calories close the gap to the window
+    picks = np.column_stack(
+        [rng.choice(c, size=samples) for c in candidates[:-1]]
+    ) if len(candidates) > 1 else np.empty((samples, 0), np.int64)
+    partial = nutrients[picks].sum(axis=1) if picks.shape[1] else np.zeros((samples, 4), np.int32)
+
+    last = candidates[-1]
+    order = np.argsort(nutrients[last, 0], kind="stable")
+    last_sorted = last[order]
+    last_kcal = nutrients[last_sorted, 0]
+    lo = np.searchsorted(last_kcal, lower - partial[:, 0], side="left")
+    hi = np.searchsorted(last_kcal, upper - partial[:, 0], side="right")
+    hit = hi > lo
+    if not hit.any():
+        return np.empty((0, len(meal_types)), np.int32), np.empty((0, 4), np.int32)
+
+    offsets = lo[hit] + (rng.random(hit.sum()) * (hi[hit] - lo[hit])).astype(np.int64)
+    rows = np.column_stack([picks[hit], last_sorted[offsets]])
+
+    # A recipe may serve several meal types; it must not repeat within a day
+    sorted_rows = np.sort(rows, axis=1)
+    distinct = (np.diff(sorted_rows, axis=1) != 0).all(axis=1) if rows.shape[1] > 1 else np.ones(len(rows), bool)
+    rows = rows[distinct]
+    rows = np.unique(rows, axis=0)
+
+    return ids[rows], nutrients[rows].sum(axis=1).astype(np.int32)
+
+
+def build_menu_index(
+    recipe_df,
+    calorie_buckets,
+    type_sets,
+    intolerance_sets=((),),
+    samples_per_key=100_000,
+    seed=0,
+):
+    """
+    Offline builder: for every (calorie bucket, meal types, intolerances)
+    combination, sample feasible single-dish daily menus and keep them as
+    compact int32 arrays. Macro caps depend on the request ratios, so the
+    per-menu totals are stored and filtered at request time.
+    """
+    rng = np.random.default_rng(seed)
+    index = {}
+    for intolerances in intolerance_sets:
+        allowed = filter_intolerances(recipe_df, intolerances)
+        for meal_types in type_sets:
+            for bucket in calorie_buckets:
+                # Cover every request that rounds into this bucket
+                center = bucket * CALORIE_BUCKET
+                lower = center - CALORIE_BUCKET // 2 - CALORIE_TOLERANCE
+                upper = center + CALORIE_BUCKET // 2 + CALORIE_TOLERANCE
+                ids, totals = sample_daily_menus(
+                    allowed, meal_types, lower, upper, samples_per_key, rng
+                )
+                if len(ids):
+                    index[index_key(bucket, meal_types, intolerances)] = (ids, totals)
+    return index
+
+
+def save_menu_index(index, path):
+    arrays = {}
+    for key, (ids, totals) in index.items():
+        arrays[f"{key}_ids"] = ids
+        arrays[f"{key}_totals"] = totals
+    np.savez_compressed(path, **arrays)
+
+
+def load_menu_index(path):
+    index = {}
+    with np.load(path) as data:
+        for name in data.files:
+            if name.endswith("_ids"):
+                key = name[: -len("_ids")]
+                index[key] = (data[name], data[f"{key}_totals"])
+    return index
+
+
+def assemble_from_index(
+    index,
+    targets,
+    days,
+    meal_types,
+    intolerances=(),
+    exclude=(),
+    allowed_ids=None,
+    cache=None,
+    seed=None,
+    max_attempts=20,
+):
+    """
+    Assemble `days` recipe-disjoint daily menus from the index, skipping
+    menus that use any recipe in `exclude`. When `allowed_ids` is given
+    (a tenant's catalog), only menus made entirely of those recipes are
+    used; the membership mask is memoised per index key in `cache`.
+    Returns one list of recipe ids per day, in sorted meal type order, or
+    None on a miss so the caller can fall back to the CP-SAT solver.
+    """
+    key = index_key(calorie_bucket(targets["calories_per_day"]), meal_types, intolerances)
+    entry = index.get(key)
+    if entry is None:
+        return None
+    ids, totals = entry
+
+    calories = int(targets["calories_per_day"])
+    feasible = (
+        (totals[:, 0] >= calories - CALORIE_TOLERANCE)
+        & (totals[:, 0] <= calories + CALORIE_TOLERANCE)
+        & (totals[:, 1] <= targets["carbs"])
+        & (totals[:, 2] <= targets["fats"])
+        & (totals[:, 3] <= targets["protein"])
+    )
+    if allowed_ids is not None:
+        in_catalog = cache.get(key) if cache is not None else None
+        if in_catalog is None:
+            in_catalog = np.isin(ids, allowed_ids).all(axis=1)
+            if cache is not None:
+                cache[key] = in_catalog
+        feasible &= in_catalog
+    if exclude:
+        feasible &= ~np.isin(ids, list(exclude)).any(axis=1)
+    candidates = ids[feasible]
+    if len(candidates) < days:
+        return None
+
+    # Randomised greedy matching: take menus in shuffled order while they
+    # share no recipe with the menus already picked
+    rng = np.random.default_rng(seed)
+    for _ in range(max_attempts):
+        used = set()
+        picked = []
+        for row in candidates[rng.permutation(len(candidates))]:
+            recipes = row.tolist()
+            if used.isdisjoint(recipes):
+                picked.append(recipes)
+                used.update(recipes)
+                if len(picked) == days:
+                    return picked
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the precomputed daily-menu index")
+    parser.add_argument("--recipes", default="recipe_api.csv")
+    parser.add_argument("--flags", default="updated_recipe_df.csv", help="CSV with intolerance flags")
+    parser.add_argument("--out", default="menu_index.npz")
+    parser.add_argument("--min-calories", type=int, default=1200)
+    parser.add_argument("--max-calories", type=int, default=4000)
+    parser.add_argument(
+        "--types",
+        nargs="+",
+        default=["0,1,2,3,4", "0,2,4"],
+        help="Meal type sets, e.g. 0,1,2,3,4 0,2,4",
+    )
+    parser.add_argument(
+        "--intolerances",
+        nargs="*",
+        default=[],
+        help="Intolerance sets, e.g. 'Gluten Intolerance' 'Nut Allergy,Egg Allergy'",
+    )
+    parser.add_argument("--samples", type=int, default=100_000)
+    args = parser.parse_args()
+
+    recipe_df = pd.read_csv(args.recipes)
+    recipe_df["id"] = recipe_df["id"].astype(int)
+    recipe_df["meal_types_set"] = recipe_df["categories"].apply(
+        lambda x: set(map(int, x.split(",")))
+    )
+    if args.intolerances:
+        recipe_df = join_intolerance_flags(recipe_df, args.flags)
+
+    index = build_menu_index(
+        recipe_df,
+        calorie_buckets=range(
+            calorie_bucket(args.min_calories), calorie_bucket(args.max_calories) + 1
+        ),
+        type_sets=[[int(t) for t in s.split(",")] for s in args.types],
+        intolerance_sets=[()] + [tuple(s.split(",")) for s in args.intolerances],
+        samples_per_key=args.samples,
+    )
+    save_menu_index(index, args.out)
+    print(f"Saved {len(index)} index entries to {args.out}")
@@ -0,0 +1,145 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU mapping with a fixed number of entries
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TenantCatalog:
+    """
+    One shared recipe catalog with per-company row positions.
+    Tenants never copy the catalog or its precomputed arrays; each company
+    is an int32 position array into the shared DataFrame.
+    """
+
+    def __init__(self, recipe_df, company_recipes_path=None):
+        company_ids = np.full(len(recipe_df), -1, dtype=np.int64)
+        if company_recipes_path is not None:
+            companies = pd.read_csv(company_recipes_path, usecols=["id", "company_id"])
+            company_by_recipe = companies.set_index("id")["company_id"]
+            mapped = recipe_df["id"].map(company_by_recipe)
+            company_ids = mapped.fillna(-1).astype(np.int64).to_numpy()
+            self._report_unmapped(recipe_df, companies, mapped)
+
+        recipe_ids = recipe_df["id"].to_numpy()
+        self._positions = {
+            int(company_id): np.flatnonzero(company_ids == company_id).astype(np.int32)
+            for company_id in np.unique(company_ids)
+            if company_id >= 0
+        }
+        self._recipe_ids = {
+            company_id: recipe_ids[positions]
+            for company_id, positions in self._positions.items()
+        }
+
+    @staticmethod
+    def _report_unmapped(recipe_df, companies, mapped):
+        catalog_ids = set(recipe_df["id"])
+        missing = companies[~companies["id"].isin(catalog_ids)]
+        for company_id, recipes in missing.groupby("company_id")["id"]:
+            print(
+                f"Company {company_id}: {len(recipes)} recipes not in the catalog "
+                f"(ids {sorted(recipes.tolist())})"
+            )
+        mapped_companies = set(mapped.dropna().astype(int))
+        for company_id in sorted(set(companies["company_id"]) - mapped_companies):
+            print(f"Company {company_id} has no recipes in the catalog; requests for it return 404")
+        unassigned = int(mapped.isna().sum())
+        if unassigned:
+            print(f"{unassigned} catalog recipes have no company and are only in the global catalog")
+
+    def companies(self):
+        return sorted(self._positions)
+
+    def positions(self, company_id):
+        return self._positions.get(int(company_id))
+
+    def recipe_ids_for(self, company_id):
+        return self._recipe_ids.get(int(company_id))
+
+
+class TenantCaches:
+    """
+    Per-tenant cache partitions. Each tenant gets its own LRU of at most
+    `entries_per_tenant` entries, so a busy tenant only evicts its own
+    entries. At most `max_tenants` partitions are kept to bound total
+    memory; beyond that, a new tenant evicts the least recently used
+    tenant's whole partition.
+    """
+
+    def __init__(self, max_tenants, entries_per_tenant):
+        self.entries_per_tenant = entries_per_tenant
+        self._partitions = LRUCache(max_tenants)
+        self._lock = threading.Lock()
+
+    def partition(self, tenant):
+        with self._lock:
+            cache = self._partitions.get(tenant)
+            if cache is None:
+                cache = LRUCache(self.entries_per_tenant)
+                self._partitions[tenant] = cache
+            return cache
+
+
+class SolverQuota:
+    """
+    Bounds concurrent CP-SAT solves globally and per tenant, so one large
+    company's batch cannot take every solver slot. Tenant slots are taken
+    without waiting: a tenant over its quota is refused at once instead of
+    parking shared worker threads, and only the global pool is waited on.
+    """
+
+    def __init__(self, pool_size, per_tenant, timeout):
+        self.per_tenant = per_tenant
+        self.timeout = timeout
+        self._pool = threading.BoundedSemaphore(pool_size)
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def _tenant_semaphore(self, tenant):
+        with self._lock:
+            if tenant not in self._tenants:
+                self._tenants[tenant] = threading.BoundedSemaphore(self.per_tenant)
+            return self._tenants[tenant]
+
+    def acquire(self, tenant, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        tenant_slot = self._tenant_semaphore(tenant)
+        if not tenant_slot.acquire(blocking=False):
+            return False
+        if not self._pool.acquire(timeout=max(timeout, 0)):
+            tenant_slot.release()
+            return False
+        return True
+
+    def release(self, tenant):
+        self._pool.release()
+        self._tenant_semaphore(tenant).release()
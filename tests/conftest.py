@@ -0,0 +1,9 @@
+import os
+import sys
+
+# app.py loads its CSVs relative to the working directory at import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+# Tests build their own menu index instead of using a local menu_index.npz
+os.environ["MENU_INDEX_PATH"] = os.path.join(ROOT, "tests", "no_menu_index.npz")
@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+TOKEN = "test-token"
+DEBUG_HEADERS = {"X-Debug-Profile": "1", "X-Admin-Token": TOKEN}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", TOKEN)
+    monkeypatch.setattr(app, "menu_index", {})
+    app.debug_profiles.clear()
+    return TestClient(app.app)
+
+
+def stored_profile(client, profile_id):
+    profiles = client.get("/admin/debug-profiles", headers={"X-Admin-Token": TOKEN}).json()["profiles"]
+    return next(p for p in profiles if p["id"] == profile_id)
+
+
+def test_admin_endpoint_requires_token(client):
+    assert client.get("/admin/debug-profiles").status_code == 403
+    assert client.get("/admin/debug-profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_solver_run_captures_profile_and_all_presolve_rules(client):
+    r = client.post("/api/generate-meal-plan", json={"days": 2}, headers=DEBUG_HEADERS)
+    assert r.status_code == 200
+
+    profile = stored_profile(client, r.headers["X-Debug-Profile-Id"])
+    assert "generate_meal_plan" in profile["profile"]
+    assert profile["profileScope"] == app.PROFILE_SCOPE
+    run = profile["solverRuns"][0]
+    assert run["searchLog"]
+    assert any(not rule.startswith("- rule 'presolve") for rule in run["presolveRules"])
+
+
+@pytest.mark.parametrize("value", ["0", "false", "no"])
+def test_false_header_values_do_not_profile(client, value):
+    headers = {**DEBUG_HEADERS, "X-Debug-Profile": value}
+    r = client.post("/api/generate-meal-plan", json={"company_id": 999}, headers=headers)
+    assert "X-Debug-Profile-Id" not in r.headers
+    assert not app.debug_profiles
+
+
+def test_busy_profiler_still_captures_solver_log(client):
+    with app.profile_lock:
+        r = client.post("/api/generate-meal-plan", json={"days": 2}, headers=DEBUG_HEADERS)
+    assert r.status_code == 200
+
+    profile = stored_profile(client, r.headers["X-Debug-Profile-Id"])
+    assert profile["profile"].startswith("skipped")
+    assert profile["solverRuns"]
+
+
+def test_failed_request_keeps_debug_header(client):
+    r = client.post("/api/generate-meal-plan", json={"company_id": 999}, headers=DEBUG_HEADERS)
+    assert r.status_code == 404
+
+    profile = stored_profile(client, r.headers["X-Debug-Profile-Id"])
+    assert profile["error"] == "Unknown company 999"
@@ -0,0 +1,70 @@
+import pytest
+
+import app
+from menu_index import (
+    CALORIE_TOLERANCE,
+    assemble_from_index,
+    build_menu_index,
+    calorie_bucket,
+    filter_intolerances,
+)
+
+MEAL_TYPES = [0, 1, 2, 3, 4]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return build_menu_index(
+        app.recipe_df,
+        calorie_buckets=[calorie_bucket(2000)],
+        type_sets=[MEAL_TYPES],
+        intolerance_sets=[(), ("Nut Allergy",)],
+        samples_per_key=50_000,
+    )
+
+
+def nutrients(recipe_id):
+    recipe = app.recipe_df[app.recipe_df["id"] == recipe_id].iloc[0]
+    return (
+        int(recipe["energy_kcal"]),
+        int(recipe["carbs"]),
+        int(recipe["total_fats"]),
+        int(recipe["protein"]),
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_assembled_days_meet_targets_without_repeats(index, seed):
+    targets = app.calculate_macronutrient_targets(2000, 0.5, 0.3, 0.2)
+    plan = assemble_from_index(index, targets, 7, MEAL_TYPES, seed=seed)
+    assert plan is not None and len(plan) == 7
+
+    for recipes in plan:
+        assert len(recipes) == len(MEAL_TYPES)
+        kcal, carbs, fats, protein = (sum(n) for n in zip(*map(nutrients, recipes)))
+        assert abs(kcal - 2000) <= CALORIE_TOLERANCE
+        assert carbs <= targets["carbs"]
+        assert fats <= targets["fats"]
+        assert protein <= targets["protein"]
+
+    all_recipes = [recipe_id for recipes in plan for recipe_id in recipes]
+    assert len(all_recipes) == len(set(all_recipes))
+
+
+def test_intolerance_menus_exclude_flagged_recipes(index):
+    targets = app.calculate_macronutrient_targets(2000, 0.5, 0.3, 0.2)
+    plan = assemble_from_index(index, targets, 3, MEAL_TYPES, intolerances=("Nut Allergy",), seed=0)
+    assert plan is not None
+
+    flags = app.recipe_df.set_index("id")["Nut Allergy"]
+    assert all(flags[recipe_id] == 0 for recipes in plan for recipe_id in recipes)
+
+
+def test_missing_intolerance_column_is_an_error():
+    with pytest.raises(ValueError):
+        filter_intolerances(app.recipe_df.drop(columns=["Nut Allergy"]), ["Nut Allergy"])
+
+
+def test_index_miss_returns_none(index):
+    targets = app.calculate_macronutrient_targets(5000, 0.5, 0.3, 0.2)
+    assert assemble_from_index(index, targets, 7, MEAL_TYPES) is None
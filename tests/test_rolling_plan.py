@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from menu_index import build_menu_index, calorie_bucket
+
+MEAL_TYPES = [0, 1, 2, 3, 4]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return build_menu_index(
+        app.recipe_df,
+        calorie_buckets=[calorie_bucket(2000)],
+        type_sets=[MEAL_TYPES],
+        samples_per_key=50_000,
+    )
+
+
+def test_min_reuse_gap_is_at_least_cooldown(monkeypatch, index):
+    monkeypatch.setattr(app, "menu_index", index)
+    targets = app.calculate_macronutrient_targets(2000, 0.5, 0.3, 0.2)
+
+    plan = app.generate_rolling_meal_plan(app.recipe_df, targets, 60, MEAL_TYPES)
+    assert len(plan) == 60
+
+    last_used = {}
+    min_gap = None
+    for day, daily_plan in enumerate(plan):
+        for meals in daily_plan.values():
+            for meal in meals:
+                recipe_id = meal["recipe_id"]
+                if recipe_id in last_used:
+                    gap = day - last_used[recipe_id]
+                    min_gap = gap if min_gap is None else min(min_gap, gap)
+                last_used[recipe_id] = day
+
+    assert min_gap is not None and min_gap >= app.RECIPE_COOLDOWN_DAYS
+
+
+def test_deadline_exceeded_returns_503(monkeypatch):
+    monkeypatch.setattr(app, "menu_index", {})
+    monkeypatch.setattr(app, "ROLLING_PLAN_DEADLINE_SECONDS", 0.5)
+
+    r = TestClient(app.app).post("/api/generate-meal-plan", json={"days": 30, "calories": 700})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"]
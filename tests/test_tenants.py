@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import anyio
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import app
+from tenants import SolverQuota, TenantCaches
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    quota = SolverQuota(pool_size=4, per_tenant=1, timeout=0.01)
+    monkeypatch.setattr(app, "solver_quota", quota)
+    return quota
+
+
+def test_exhausted_tenant_gets_429_while_other_tenant_gets_a_slot(quota):
+    with app.solver_slot(1):
+        with pytest.raises(HTTPException) as exc:
+            with app.solver_slot(1):
+                pass
+        assert exc.value.status_code == 429
+
+        with app.solver_slot(2):
+            pass
+
+
+def test_slot_is_released_after_solve(quota):
+    with app.solver_slot(1):
+        pass
+    with app.solver_slot(1):
+        pass
+
+
+def test_tenant_over_quota_is_refused_without_waiting():
+    quota = SolverQuota(pool_size=4, per_tenant=1, timeout=5)
+    assert quota.acquire(1)
+    start = time.monotonic()
+    assert not quota.acquire(1)
+    assert time.monotonic() - start < 0.5
+
+
+def test_pool_wait_is_bounded_by_one_timeout():
+    quota = SolverQuota(pool_size=1, per_tenant=1, timeout=0.3)
+    assert quota.acquire(1)
+    start = time.monotonic()
+    assert not quota.acquire(2)
+    assert time.monotonic() - start < 0.5
+    # The refused tenant's own slot was given back
+    quota.release(1)
+    assert quota.acquire(2)
+
+
+def test_busy_tenant_does_not_delay_other_tenants(monkeypatch):
+    company_id = app.tenant_catalog.companies()[0]
+    recipe_id = int(app.tenant_catalog.recipe_ids_for(company_id)[0])
+
+    def slow_solve(*args, **kwargs):
+        time.sleep(1)
+        return [{"BREAKFAST": [{"recipe_id": recipe_id, "amount": 1}]}]
+
+    monkeypatch.setattr(app, "menu_index", {})
+    monkeypatch.setattr(app, "generate_meal_plan", slow_solve)
+    monkeypatch.setattr(app, "solver_quota", SolverQuota(pool_size=4, per_tenant=2, timeout=5))
+
+    async def run():
+        # A small shared threadpool makes any parked worker thread visible
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 4
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            batch = [
+                asyncio.create_task(client.post("/api/generate-meal-plan", json={"company_id": company_id}))
+                for _ in range(12)
+            ]
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            other = await client.post("/api/generate-meal-plan", json={})
+            elapsed = time.monotonic() - start
+            return other, elapsed, await asyncio.gather(*batch)
+
+    other, elapsed, batch = asyncio.run(run())
+    assert other.status_code == 200
+    assert elapsed < 2
+    assert sorted(r.status_code for r in batch).count(429) == 10
+
+
+def test_global_pool_bounds_all_tenants():
+    quota = SolverQuota(pool_size=2, per_tenant=2, timeout=0.01)
+    assert quota.acquire(1)
+    assert quota.acquire(2)
+    assert not quota.acquire(3)
+    quota.release(1)
+    assert quota.acquire(3)
+
+
+def test_cache_partitions_are_isolated():
+    caches = TenantCaches(max_tenants=4, entries_per_tenant=2)
+    caches.partition(1)["a"] = 1
+    for key in "bcd":
+        caches.partition(2)[key] = key
+    assert caches.partition(1).get("a") == 1
+
+
+def test_company_recipe_ids_are_precomputed():
+    company_id = app.tenant_catalog.companies()[0]
+    assert app.tenant_catalog.recipe_ids_for(company_id) is app.tenant_catalog.recipe_ids_for(company_id)
+    assert app.tenant_catalog.recipe_ids_for(12345) is None